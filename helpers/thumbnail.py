@@ -0,0 +1,58 @@
+import os
+import logging
+
+from PIL import Image
+
+from config import DOWNLOAD_LOCATION
+
+logger = logging.getLogger(__name__)
+
+THUMB_LOCATION = os.path.join(DOWNLOAD_LOCATION, "thumbnails")
+os.makedirs(THUMB_LOCATION, exist_ok=True)
+
+# Uploads ask for the user's thumbnail on every send. One listdir at
+# import enumerates every saved thumbnail, so lookups never stat: an id
+# missing from this dict simply has no thumbnail. save_thumb and
+# delete_thumb keep it in step.
+_THUMB_CACHE = {}
+for _entry in os.listdir(THUMB_LOCATION):
+    _stem, _ext = os.path.splitext(_entry)
+    if _ext == ".jpg" and _stem.isdigit():
+        _THUMB_CACHE[int(_stem)] = os.path.join(THUMB_LOCATION, _entry)
+
+def thumb_path(user_id):
+    return os.path.join(THUMB_LOCATION, f"{user_id}.jpg")
+
+def get_thumb(user_id):
+    """Return the user's thumbnail path, or None if they have none."""
+    return _THUMB_CACHE.get(user_id)
+
+def save_thumb(user_id, source):
+    """Store a photo as the user's thumbnail and return its path.
+
+    source is a file path or a file-like object — pyrogram's
+    download(in_memory=True) hands back BytesIO, which PIL opens
+    directly, so the incoming photo never touches disk. Telegram caps
+    thumbnails at 320x320 / 200 KB, so resize once at save time — every
+    later upload then sends the small file instead of the original
+    photo.
+    """
+    path = thumb_path(user_id)
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        image.thumbnail((320, 320), Image.LANCZOS)
+        image.save(path, "JPEG", quality=85, optimize=True, progressive=True)
+    if isinstance(source, str):
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+    _THUMB_CACHE[user_id] = path
+    return path
+
+def delete_thumb(user_id):
+    try:
+        os.remove(thumb_path(user_id))
+    except FileNotFoundError:
+        pass
+    _THUMB_CACHE[user_id] = None
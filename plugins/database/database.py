@@ -0,0 +1,59 @@
+import time
+import motor.motor_asyncio
+
+from config import DATABASE_URL, DATABASE_NAME
+
+class Database:
+    def __init__(self, uri, database_name):
+        self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+        self.db = self._client[database_name]
+        self.col = self.db.users
+
+    def new_user(self, id):
+        return dict(
+            id=int(id),
+            join_date=time.time(),
+            upload_as_doc=False,
+            thumbnail=None
+        )
+
+    async def add_user(self, id):
+        # Upsert keeps this to one round-trip on the message hot path
+        await self.col.update_one(
+            {'id': int(id)},
+            {'$setOnInsert': self.new_user(id)},
+            upsert=True
+        )
+
+    async def is_user_exist(self, id):
+        return bool(await self.col.find_one({'id': int(id)}, {'_id': 1}))
+
+    async def get_user_data(self, id):
+        return await self.col.find_one({'id': int(id)})
+
+    async def total_users_count(self):
+        return await self.col.count_documents({})
+
+    async def get_all_users(self):
+        """Yield user IDs in 1000-document batches.
+
+        Streaming keeps broadcast memory constant no matter how many
+        users exist and lets callers cancel early.
+        """
+        async for user in self.col.find({}, {'id': 1}).batch_size(1000):
+            yield user['id']
+
+    async def set_upload_as_doc(self, id, upload_as_doc):
+        await self.col.update_one(
+            {'id': int(id)}, {'$set': {'upload_as_doc': upload_as_doc}}
+        )
+
+    async def set_thumbnail(self, id, thumbnail):
+        await self.col.update_one(
+            {'id': int(id)}, {'$set': {'thumbnail': thumbnail}}
+        )
+
+    async def delete_user(self, id):
+        await self.col.delete_many({'id': int(id)})
+
+db = Database(DATABASE_URL, DATABASE_NAME)
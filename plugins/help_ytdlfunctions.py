@@ -1,12 +1,14 @@
 import re
-import aiohttp
+
+# One pooled session for the whole process — see plugins.utils
+from plugins.utils import get_session
 
 async def get_file_extension_from_url(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.head(url, allow_redirects=True) as response:
-            content_type = response.headers.get('Content-Type')
-            if content_type:
-                return content_type.split('/')[-1]
+    session = await get_session()
+    async with session.head(url, allow_redirects=True) as response:
+        content_type = response.headers.get('Content-Type')
+        if content_type:
+            return content_type.split('/')[-1]
     return "jpg"
 
 def get_resolution(info_dict):
@@ -50,21 +50,22 @@ async def open_settings(m: "types.Message"):
         )
     ])
 
-    try:
-        await m.edit(
-            text="**ʜᴇʀᴇ ʏᴏᴜ ᴄᴀɴ sᴇᴛᴜᴘ ʏᴏᴜʀ sᴇᴛᴛɪɴɢs**",
-            reply_markup=types.InlineKeyboardMarkup(buttons_markup),
-            disable_web_page_preview=True,
-            parse_mode=enums.ParseMode.MARKDOWN
-        )
-    except errors.MessageNotModified:
-        pass
-    except errors.FloodWait as e:
-        logger.warning(f"Flood wait: sleeping for {e.x} seconds")
-        await asyncio.sleep(e.x)
+    # Bounded retry loop; recursing on FloodWait re-fetched user data
+    # and grew the stack on every wait
+    for _ in range(3):
         try:
-            await open_settings(m)
-        except Exception as retry_err:
-            logger.error(f"Failed to retry settings: {retry_err}")
-    except Exception as err:
-        logger.error(f"Error in open_settings: {err}")
+            await m.edit(
+                text="**ʜᴇʀᴇ ʏᴏᴜ ᴄᴀɴ sᴇᴛᴜᴘ ʏᴏᴜʀ sᴇᴛᴛɪɴɢs**",
+                reply_markup=types.InlineKeyboardMarkup(buttons_markup),
+                disable_web_page_preview=True,
+                parse_mode=enums.ParseMode.MARKDOWN
+            )
+            return
+        except errors.MessageNotModified:
+            return
+        except errors.FloodWait as e:
+            logger.warning(f"Flood wait: sleeping for {e.value} seconds")
+            await asyncio.sleep(e.value)
+        except Exception as err:
+            logger.error(f"Error in open_settings: {err}")
+            return
@@ -1,40 +1,57 @@
 import logging
+from logging.handlers import RotatingFileHandler
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),  # Outputs to console
-        logging.FileHandler('bot.log')  # Outputs to a log file
+        # Rotated so bot.log cannot grow without bound
+        RotatingFileHandler('bot.log', maxBytes=10 * 1024 * 1024, backupCount=3)
     ]
 )
 
+logger = logging.getLogger(__name__)
+
+import io
 import os
 import re
-import uuid
+import copy
 import time
 import asyncio
-import math
 import datetime
-import traceback
+import functools
+
+from pyrogram import Client, filters, idle
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pyrogram.errors import FloodWait, MessageNotModified
 
-from pyrogram import Client, filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import FloodWait
-from pyrogram.enums import ParseMode
+from collections import defaultdict, deque
 
 import yt_dlp
-import aiohttp
-import aiofiles
 
 # Import config variables directly
 from config import (
-    API_ID, API_HASH, BOT_TOKEN, SESSION_STRING, 
-    OWNER_ID, MAX_FILE_SIZE, DOWNLOAD_LOCATION
+    API_ID, API_HASH, BOT_TOKEN, SESSION_STRING,
+    OWNER_ID, MAX_FILE_SIZE, DOWNLOAD_LOCATION, AUTH_USERS
 )
 
 # Utility functions
-from plugins.utils import get_filename, get_file_size, file_size_format
-from helpers.utils import async_download_file
+from plugins.utils import (
+    get_url_metadata, file_size_format, get_session, close_session,
+    progress, progressArgs, async_download_file
+)
+from helpers.thumbnail import get_thumb, save_thumb, delete_thumb
+from plugins.database.database import db
+
+bot = Client(
+    "UrlUploaderBot",
+    api_id=API_ID,
+    api_hash=API_HASH,
+    bot_token=BOT_TOKEN,
+    # Handler workers sized to the machine; oversubscribing them just
+    # buys GIL contention on the small VMs this runs on
+    workers=min(32, (os.cpu_count() or 1) * 4)
+)
 
 # Define text constants
 START_TEXT = """
@@ -78,71 +95,547 @@ ABOUT_TEXT = """
 A powerful Telegram bot designed to make file downloading and uploading seamless!
 """
 
+# Static menus are built once; rebuilding button objects per message
+# only feeds the GC
+START_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📖 ʜᴇʟᴘ", callback_data="help"),
+        InlineKeyboardButton("ℹ️ ᴀʙᴏᴜᴛ", callback_data="about")
+    ]
+])
+
+BACK_TO_START_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 ʙᴀᴄᴋ ᴛᴏ sᴛᴀʀᴛ", callback_data="start")]
+])
+
+# Created once at import; os.makedirs(exist_ok=True) still stats on
+# every call, so keep it out of the per-request path
+os.makedirs(DOWNLOAD_LOCATION, exist_ok=True)
+
+class TTLDict:
+    """Small TTL store for pending callback state.
+
+    Plain dicts grew forever when users never pressed a button; entries
+    here expire lazily and the size stays bounded.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}
+
+    def _purge(self):
+        now = time.time()
+        expired = [k for k, (ts, _) in self._data.items() if now - ts > self.ttl]
+        for key in expired:
+            del self._data[key]
+        while len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+
+    def __setitem__(self, key, value):
+        self._purge()
+        self._data[key] = (time.time(), value)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        ts, value = entry
+        if time.time() - ts > self.ttl:
+            del self._data[key]
+            return default
+        return value
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._data.pop(key, None)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
 # Constants and storage
-pending_downloads = {}
-pending_renames = {}
+pending_downloads = TTLDict(maxsize=50_000, ttl=1800)
+
+# Users mash Back-to-Start, so their status block is cached for a
+# minute rather than recomputed (or, later, re-fetched from a DB)
+USER_INFO_TTL = 60
+USER_INFO_MAX = 1024
+_user_info_cache = {}
+
+async def get_user_info(user_id):
+    cached = _user_info_cache.get(user_id)
+    if cached is not None and time.time() - cached[0] < USER_INFO_TTL:
+        return cached[1]
+
+    info = {
+        'status': '👑 Premium' if user_id in AUTH_USERS else '🆓 Free',
+        'storage': file_size_format(MAX_FILE_SIZE),
+        'features': (
+            "• Upload files up to 4GB\n"
+            "• YouTube quality selection\n"
+            "• Fast parallel downloads"
+        ),
+    }
+    if len(_user_info_cache) >= USER_INFO_MAX:
+        oldest = min(_user_info_cache, key=lambda k: _user_info_cache[k][0])
+        del _user_info_cache[oldest]
+    _user_info_cache[user_id] = (time.time(), info)
+    return info
+
+# There are only a handful of distinct status blocks, so the formatted
+# start text is memoized on its inputs
+@functools.lru_cache(maxsize=128)
+def render_start_text(status, storage, features):
+    return START_TEXT.format(status=status, storage=storage, features=features)
+
+class TokenBucket:
+    """Proactive limiter for Telegram writes.
+
+    Waiting for a token up front is far cheaper than burning a failed
+    round-trip and a FloodWait once the 30 msg/s ceiling is hit.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # Created on first acquire: a Lock built at import time binds
+        # get_event_loop()'s loop on Python 3.9, not the asyncio.run()
+        # loop, and the first contended acquire then raises
+        # "attached to a different loop"
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Stay under Telegram's ~30 msg/s bot-wide and 1 msg/s per-chat caps
+GLOBAL_SEND_BUCKET = TokenBucket(rate=25, burst=25)
+_chat_buckets = defaultdict(lambda: TokenBucket(rate=1, burst=3))
+
+async def rate_limited_send(client, chat_id, text, **kwargs):
+    await GLOBAL_SEND_BUCKET.acquire()
+    await _chat_buckets[chat_id].acquire()
+    return await client.send_message(chat_id, text, **kwargs)
+
+async def safe_edit_message(message, text, max_retries=3, **kwargs):
+    """Edit a message with bounded FloodWait retries.
+
+    A loop, not recursion: recursing on every FloodWait grows the stack
+    without limit under a sustained flood.
+    """
+    for _ in range(max_retries):
+        try:
+            await message.edit_text(text, **kwargs)
+            return True
+        except MessageNotModified:
+            # The message already shows this content — that's success,
+            # not a reason to post a duplicate via the fallback
+            return True
+        except FloodWait as flood:
+            await asyncio.sleep(flood.value)
+        except Exception as e:
+            logger.warning("safe_edit_message failed: %s", e)
+            break
+    try:
+        await message.reply_text(text, **kwargs)
+        return True
+    except Exception:
+        return False
+
+# Last few bot replies per user so chats stay tidy; deque(maxlen=...)
+# evicts the oldest ID in O(1) instead of list.pop(0) shuffling
+TRACKED_MESSAGES_PER_USER = 3
+recent_bot_messages = defaultdict(lambda: deque(maxlen=TRACKED_MESSAGES_PER_USER))
+
+async def send_tracked_message(client, chat_id, text, **kwargs):
+    """Send a message and delete the user's oldest tracked one."""
+    history = recent_bot_messages[chat_id]
+    overflow = len(history) - history.maxlen + 1
+    evicted = [history[i] for i in range(overflow)] if overflow > 0 else []
+
+    message = await rate_limited_send(client, chat_id, text, **kwargs)
+    history.append(message.id)
+
+    if evicted:
+        try:
+            # One RPC deletes the whole batch; pyrogram skips IDs the
+            # user already removed
+            await client.delete_messages(chat_id, evicted)
+        except Exception:
+            pass
+    return message
+
 URL_REGEX = r'https?://[^\s<>"]+|www\.[^\s<>"]+'
 YOUTUBE_REGEX = r'(?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/shorts/)([a-zA-Z0-9_-]+)'
 
+# Compiled once at import so the hot paths never re-hash the pattern
+# string. One alternation classifies a message in a single scan;
+# lastgroup says which kind of link matched
+COMBINED_URL_PATTERN = re.compile(f"(?P<yt>{YOUTUBE_REGEX})|(?P<url>{URL_REGEX})")
+SANITIZE_PATTERN = re.compile(r'[^\w\-_\. ]')
+# translate() is several times faster than re.sub for this ASCII case
+SANITIZE_TABLE = {
+    c: '_' for c in range(256) if SANITIZE_PATTERN.match(chr(c))
+}
+
+def sanitize_filename(name):
+    """Replace characters Telegram/filesystems dislike with underscores."""
+    if not SANITIZE_PATTERN.search(name):
+        return name
+    try:
+        name.encode('latin-1')
+    except UnicodeEncodeError:
+        # The table only covers code points < 256; anything beyond
+        # (emoji, CJK punctuation) takes the regex path instead of
+        # slipping through translate() untouched
+        return SANITIZE_PATTERN.sub('_', name)
+    return name.translate(SANITIZE_TABLE)
+
+# Constructing a YoutubeDL walks the whole extractor list every time, so
+# keep one instance alive per distinct option set and reuse it
+YTDL_CACHE_DIR = os.path.join(DOWNLOAD_LOCATION, ".ytdl-cache")
+_YDL_INSTANCES = {}
+
+# The quality keyboard and the download that follows it used to extract
+# the same URL twice; keep recent info dicts around for five minutes
+INFO_CACHE_TTL = 300
+INFO_CACHE_MAX = 256
+_info_cache = {}
+
+def cache_video_info(url, info):
+    if len(_info_cache) >= INFO_CACHE_MAX:
+        oldest = min(_info_cache, key=lambda k: _info_cache[k][0])
+        del _info_cache[oldest]
+    _info_cache[url] = (time.time(), info)
+
+def get_cached_video_info(url):
+    entry = _info_cache.get(url)
+    if entry is None:
+        return None
+    cached_at, info = entry
+    if time.time() - cached_at > INFO_CACHE_TTL:
+        del _info_cache[url]
+        return None
+    return info
+
+def get_ydl(ydl_opts):
+    opts = dict(ydl_opts)
+    opts.setdefault('cachedir', YTDL_CACHE_DIR)
+    key = repr(sorted(opts.items()))
+    ydl = _YDL_INSTANCES.get(key)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(opts)
+        _YDL_INSTANCES[key] = ydl
+    return ydl
+
+# One lock per cached instance: an instance keeps its deciphered
+# signature functions, but its mutable params must not be shared by two
+# in-flight downloads
+_YDL_LOCKS = defaultdict(asyncio.Lock)
+
+# Everything here is static; per-call dicts only splice the format in
+_YDL_BASE_OPTS = {
+    'outtmpl': os.path.join(DOWNLOAD_LOCATION, '%(title)s.%(ext)s'),
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'cachedir': YTDL_CACHE_DIR,
+}
+
 async def extract_youtube_info(url):
     ydl_opts = {
         'format': 'best',
         'noplaylist': True,
         'quiet': True,
         'no_warnings': True,
+        'extractor_args': {'youtube': {'player_skip': ['webpage', 'configs']}},
     }
-    
+
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            formats = info.get('formats', [])
-            
-            # Get best quality format
-            for f in formats:
-                return {
-                    'url': f['url'],
-                    'title': info.get('title', 'video'),
-                    'duration': info.get('duration'),
-                    'filesize': f.get('filesize', 0)
-                }
-            
-            return None
+        ydl = get_ydl(ydl_opts)
+        # extract_info is blocking network+CPU; keep it off the event loop
+        info = await asyncio.to_thread(ydl.extract_info, url, download=False)
+        formats = info.get('formats', [])
+
+        # Get best quality format
+        for f in formats:
+            return {
+                'url': f['url'],
+                'title': info.get('title', 'video'),
+                'duration': info.get('duration'),
+                'filesize': f.get('filesize', 0)
+            }
+
+        return None
     except Exception as e:
-        logging.error(f"YouTube extraction error: {str(e)}")
+        logger.error("YouTube extraction error: %s", e)
         return None
 
-async def send_file(client, chat_id, document, file_name, caption=None, progress=None, progress_args=None):
-    """Send file to chat"""
+# Telegram allows roughly ten parallel part operations before answering
+# with FLOOD_WAIT, so gate every upload on one shared semaphore.
+# Both semaphores are created on first use so they bind the running
+# loop rather than the import-time one (Python 3.9)
+UPLOAD_SEM = None
+
+# yt-dlp downloads are CPU + network heavy; cap how many run at once so
+# a burst of links can't saturate the box
+YTDL_SEM = None
+
+# Telegram needs a seekable source, so true socket-to-socket piping is
+# out; files that fit in RAM skip the disk round-trip entirely instead
+RAM_UPLOAD_MAX = 64 * 1024 * 1024
+
+async def download_to_memory(url, max_size=RAM_UPLOAD_MAX):
+    """Stream a URL into BytesIO when it fits in RAM, else return None."""
+    session = await get_session()
+    async with session.get(url) as response:
+        if response.status != 200:
+            return None
+
+        total_size = int(response.headers.get('Content-Length', 0))
+        if not total_size or total_size > max_size:
+            return None
+
+        buffer = io.BytesIO()
+        async for chunk in response.content.iter_chunked(1 << 20):
+            buffer.write(chunk)
+            if buffer.tell() > max_size:
+                return None
+
+        buffer.seek(0)
+        return buffer
+
+async def send_url_file(client, chat_id, url, file_name, caption=None, progress=None, progress_args=None):
+    """Upload a URL to Telegram, bypassing disk for small files."""
+    buffer = await download_to_memory(url)
+    if buffer is not None:
+        buffer.name = file_name
+        return await send_file(
+            client, chat_id, buffer, file_name,
+            caption=caption, progress=progress, progress_args=progress_args
+        )
+
+    file_path = await async_download_file(
+        url, file_name, progress=progress, progress_args=progress_args or ()
+    )
     try:
-        return await client.send_document(
-            chat_id=chat_id,
-            document=document,
-            caption=caption,
-            file_name=file_name,
-            progress=progress,
-            progress_args=progress_args
+        return await send_file(
+            client, chat_id, file_path, file_name,
+            caption=caption, progress=progress, progress_args=progress_args
         )
+    finally:
+        try:
+            # One unlink, off-loop — metadata I/O can stall under disk
+            # pressure; a prior exists() check is just an extra stat
+            await asyncio.to_thread(os.remove, file_path)
+        except FileNotFoundError:
+            pass
+
+# Extension decides the send method up front — probing send_document
+# first and falling back would cost an extra RPC on most uploads
+_EXT_METHOD = {
+    '.mp4': 'send_video', '.mkv': 'send_video', '.webm': 'send_video',
+    '.mov': 'send_video', '.avi': 'send_video',
+    '.mp3': 'send_audio', '.m4a': 'send_audio', '.flac': 'send_audio',
+    '.ogg': 'send_audio', '.wav': 'send_audio', '.opus': 'send_audio',
+}
+# Each method wants the file under its own keyword
+_METHOD_KWARG = {
+    'send_video': 'video',
+    'send_audio': 'audio',
+    'send_document': 'document',
+}
+
+async def send_file(client, chat_id, document, file_name, caption=None, progress=None, progress_args=None):
+    """Send file to chat, picking video/audio/document by extension."""
+    global UPLOAD_SEM
+    if UPLOAD_SEM is None:
+        UPLOAD_SEM = asyncio.BoundedSemaphore(10)
+    ext = os.path.splitext(file_name)[1].lower()
+    method_name = _EXT_METHOD.get(ext, 'send_document')
+    method = getattr(client, method_name)
+    kwargs = {_METHOD_KWARG[method_name]: document}
+    try:
+        async with UPLOAD_SEM:
+            return await method(
+                chat_id=chat_id,
+                caption=caption,
+                file_name=file_name,
+                thumb=get_thumb(chat_id),
+                progress=progress,
+                progress_args=progress_args,
+                **kwargs
+            )
     except Exception as e:
-        logging.error(f"Error in send_file: {str(e)}")
+        logger.error("Error in send_file: %s", e)
         raise
 
+async def download_youtube(url, format_id=None, progress_callback=None,
+                           audio_only=False):
+    """Download a YouTube URL and return (file_path, info_dict).
+
+    yt-dlp fires its progress hook from the download thread on every
+    tick; spawning a task per tick would allocate thousands of one-shot
+    coroutines. The hook only stores the latest numbers in a slot, and a
+    single long-lived consumer forwards them once a second.
+    """
+    global YTDL_SEM
+    if YTDL_SEM is None:
+        YTDL_SEM = asyncio.BoundedSemaphore(4)
+    if audio_only:
+        fmt = 'bestaudio/best'
+    elif format_id:
+        fmt = f"{format_id}+bestaudio/best"
+    else:
+        fmt = 'best'
+    ydl_opts = {**_YDL_BASE_OPTS, 'format': fmt}
+
+    progress_slot = None
+    downloading = True
+    progress_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def progress_hook(d):
+        # Runs on the yt-dlp download thread
+        nonlocal progress_slot
+        if d.get('status') == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            # Single reference store — threadsafe under the GIL
+            progress_slot = (d.get('downloaded_bytes', 0), total)
+            loop.call_soon_threadsafe(progress_event.set)
+
+    async def consume_progress():
+        # Event-driven: sleeps until the hook signals, then forwards the
+        # latest numbers at most once a second
+        while downloading:
+            try:
+                await asyncio.wait_for(progress_event.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            progress_event.clear()
+            slot = progress_slot
+            if slot:
+                try:
+                    await progress_callback(*slot)
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
+
+    consumer = None
+    if progress_callback:
+        consumer = asyncio.create_task(consume_progress())
+
+    # A cached instance keeps yt-dlp's deciphered player.js signature
+    # functions across videos; the per-download hook is injected through
+    # params under the instance lock so closures never reach the cache
+    # key
+    ydl = get_ydl(ydl_opts)
+    try:
+        async with YTDL_SEM, _YDL_LOCKS[id(ydl)]:
+            # params['progress_hooks'] is only read in __init__; on a
+            # live instance the downloader consults _progress_hooks
+            ydl._progress_hooks = (
+                [progress_hook] if progress_callback else []
+            )
+            try:
+                cached_info = get_cached_video_info(url)
+                if cached_info is not None:
+                    # Re-use the metadata extracted for the quality
+                    # keyboard instead of hitting YouTube again.
+                    # process_ie_result mutates the nested format dicts
+                    # in place, so a shallow copy would still poison the
+                    # cache for the next download of the same URL
+                    info = await asyncio.to_thread(
+                        ydl.process_ie_result,
+                        copy.deepcopy(cached_info),
+                        download=True,
+                    )
+                else:
+                    info = await asyncio.to_thread(
+                        ydl.extract_info, url, download=True
+                    )
+            finally:
+                ydl._progress_hooks = []
+    finally:
+        downloading = False
+        if consumer:
+            await consumer
+
+    try:
+        # Modern yt-dlp records the real output path here; asking
+        # prepare_filename would re-expand the template and stat disk
+        downloaded_file = info['requested_downloads'][0]['filepath']
+    except (KeyError, IndexError):
+        raise RuntimeError("yt-dlp returned no requested_downloads")
+    return downloaded_file, info
+
+# Pre-built texts for the common yt-dlp failures; these never change,
+# so build them once instead of formatting per error
+_ERR_PRIVATE = "❌ **Download Failed**: This video is private"
+_ERR_GEOBLOCKED = "❌ **Download Failed**: Video not available in this region"
+_ERR_AGE_GATED = "❌ **Download Failed**: Video is age-restricted"
+_ERR_UNAVAILABLE = "❌ **Download Failed**: Video is unavailable"
+_ERR_MAP = {
+    "Private video": _ERR_PRIVATE,
+    "not available in your country": _ERR_GEOBLOCKED,
+    "Sign in to confirm your age": _ERR_AGE_GATED,
+    "Video unavailable": _ERR_UNAVAILABLE,
+}
+
+def youtube_error_text(error_message):
+    """Map a yt-dlp error message to a canned reply, else format one."""
+    return next(
+        (text for needle, text in _ERR_MAP.items() if needle in error_message),
+        f"❌ **Failed to process YouTube link**\n\n`{error_message}`"
+    )
+
 async def process_youtube(client, message, url):
     try:
         progress_msg = await message.reply_text("🎥 **Processing YouTube Link...**")
         
-        # Extract info with yt-dlp to get detailed format information
+        # One full extract already includes the format list; the old
+        # flat pre-extract fetched the same page a second time. Skip the
+        # manifests/subtitles/comments the quality keyboard never uses.
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': True,
+            'noplaylist': True,
+            'skip_download': True,
+            'youtube_include_dash_manifest': False,
+            'youtube_include_hls_manifest': False,
+            'getcomments': False,
+            'writesubtitles': False,
+            'extractor_args': {
+                'youtube': {'player_client': ['web'], 'player_skip': ['webpage']}
+            },
         }
+        full_info = await asyncio.to_thread(
+            get_ydl(ydl_opts).extract_info, url, download=False
+        )
+        cache_video_info(url, full_info)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-        
-        # Get full video information
-        full_info = yt_dlp.YoutubeDL().extract_info(url, download=False)
-        
+        # The URL message's own id is the token: callback_data is
+        # limited to 64 bytes, and Telegram already stores the URL for
+        # us — a handler can recover it with get_messages if the local
+        # cache entry has expired
+        file_id = str(message.id)
+        pending_downloads[file_id] = url
+
         # Prepare video qualities keyboard
         video_buttons = []
         current_row = []
@@ -165,7 +658,7 @@ async def process_youtube(client, message, url):
                 current_row.append(
                     InlineKeyboardButton(
                         f"🎥 {resolution}", 
-                        callback_data=f"ytdl_video_quality|{url}|{fmt.get('format_id', '')}"
+                        callback_data=f"ytdl_video_quality|{file_id}|{fmt.get('format_id', '')}"
                     )
                 )
                 
@@ -177,3 +670,301 @@ async def process_youtube(client, message, url):
         # Add any remaining buttons
         if current_row:
             video_buttons.append(current_row)
+
+        # Audio-only option at the bottom
+        video_buttons.append([
+            InlineKeyboardButton(
+                "🎵 Audio (Best Quality)",
+                callback_data=f"ytdl_audio|{file_id}"
+            )
+        ])
+
+        title = full_info.get('title', 'video')
+        duration = full_info.get('duration')
+        duration_text = (
+            str(datetime.timedelta(seconds=duration)) if duration else "N/A"
+        )
+
+        await safe_edit_message(
+            progress_msg,
+            f"🎬 **{title}**\n\n"
+            f"⏱ **Duration:** `{duration_text}`\n\n"
+            "**Select the quality you want to download:**",
+            reply_markup=InlineKeyboardMarkup(video_buttons)
+        )
+    except Exception as e:
+        logger.exception("Error processing YouTube link: %s", e)
+        await message.reply_text(youtube_error_text(str(e)))
+
+# The global caps live in plugins.utils; this one stops a single user
+# from occupying every download slot at once
+_USER_DL_SEMS = defaultdict(lambda: asyncio.Semaphore(2))
+
+async def handle_url_message(client, message, url):
+    """Download a direct link and upload it back to the chat."""
+    metadata = await get_url_metadata(url)
+    file_name = sanitize_filename(metadata['filename'])
+    file_size = metadata['size']
+
+    if file_size and file_size > MAX_FILE_SIZE:
+        await message.reply_text(
+            f"❌ **File too large!**\n\n"
+            f"Maximum allowed size: `{file_size_format(MAX_FILE_SIZE)}`"
+        )
+        return
+
+    size_text = file_size_format(file_size) if file_size else "unknown size"
+    progress_msg = await message.reply_text(
+        f"📥 **Downloading...**\n\n`{file_name}` ({size_text})"
+    )
+    try:
+        async with _USER_DL_SEMS[message.from_user.id]:
+            await send_url_file(
+                client, message.chat.id, url, file_name,
+                progress=progress,
+                progress_args=progressArgs(
+                    "📥 Download", progress_msg, time.time()
+                )
+            )
+        await progress_msg.delete()
+    except Exception as e:
+        logger.error("Download failed for %s: %s", url, e)
+        await safe_edit_message(progress_msg, f"❌ **Download failed**\n\n`{e}`")
+
+@bot.on_callback_query(filters.regex(r"^ytdl_(video_quality|audio)\|"))
+async def ytdl_callback_handler(client, callback_query):
+    """Run the download a quality button promised and upload the result."""
+    data = callback_query.data.split("|")
+    action, file_id = data[0], data[1]
+    format_id = data[2] if len(data) > 2 and data[2] else None
+
+    url = pending_downloads.get(file_id)
+    if url is None and file_id.isdigit():
+        # The token is the URL message's own id, so Telegram still has
+        # the link even after the local cache entry expired
+        try:
+            source = await client.get_messages(
+                callback_query.message.chat.id, int(file_id)
+            )
+            if source and source.text:
+                match = COMBINED_URL_PATTERN.match(source.text.strip())
+                if match:
+                    url = match.group(0)
+                    pending_downloads[file_id] = url
+        except Exception as e:
+            logger.warning("Could not recover URL for %s: %s", file_id, e)
+    if url is None:
+        await callback_query.answer(
+            "⌛️ This link has expired — please send it again", show_alert=True
+        )
+        return
+
+    await callback_query.answer("📥 Download started")
+    progress_msg = callback_query.message
+    start_time = time.time()
+
+    async def on_progress(current, total):
+        if total:
+            await progress(current, total, progress_msg, start_time, "📥 Download")
+
+    try:
+        async with _USER_DL_SEMS[callback_query.from_user.id]:
+            file_path, info = await download_youtube(
+                url,
+                format_id=format_id,
+                progress_callback=on_progress,
+                audio_only=(action == "ytdl_audio")
+            )
+        await safe_edit_message(progress_msg, "📤 **Uploading...**")
+        try:
+            await send_file(
+                client, progress_msg.chat.id, file_path,
+                os.path.basename(file_path),
+                caption=info.get('title')
+            )
+        finally:
+            try:
+                await asyncio.to_thread(os.remove, file_path)
+            except FileNotFoundError:
+                pass
+        await progress_msg.delete()
+    except Exception as e:
+        logger.exception("YouTube download failed for %s: %s", url, e)
+        await safe_edit_message(progress_msg, youtube_error_text(str(e)))
+
+# Session-local fallback when Mongo is unreachable
+known_users = set()
+
+async def register_user(user_id):
+    try:
+        await db.add_user(user_id)
+    except Exception as e:
+        logger.warning("Could not register user %s: %s", user_id, e)
+
+async def get_all_users():
+    """Yield user IDs straight from the database, never as one list."""
+    try:
+        async for user_id in db.get_all_users():
+            yield user_id
+    except Exception as e:
+        logger.warning("DB unavailable, using in-memory users: %s", e)
+        for user_id in known_users:
+            yield user_id
+
+BROADCAST_WORKERS = 25
+
+@bot.on_message(filters.command("broadcast") & filters.user(OWNER_ID))
+async def broadcast_handler(client, message):
+    if not message.reply_to_message:
+        await message.reply_text("❌ **Reply to a message to broadcast it**")
+        return
+
+    # Bounded queue: the producer streams IDs from Mongo while workers
+    # send, so memory stays constant regardless of user count
+    queue = asyncio.Queue(maxsize=1000)
+    sent = 0
+    failed = 0
+
+    async def producer():
+        async for user_id in get_all_users():
+            await queue.put(user_id)
+        for _ in range(BROADCAST_WORKERS):
+            await queue.put(None)
+
+    async def worker():
+        nonlocal sent, failed
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            try:
+                await GLOBAL_SEND_BUCKET.acquire()
+                await message.reply_to_message.copy(user_id)
+                sent += 1
+            except Exception as e:
+                logger.warning("Broadcast to %s failed: %s", user_id, e)
+                failed += 1
+
+    status = await message.reply_text("📣 **Broadcasting...**")
+    await asyncio.gather(producer(), *[worker() for _ in range(BROADCAST_WORKERS)])
+    await safe_edit_message(
+        status,
+        f"✅ **Broadcast finished**\n\nSent: `{sent}`\nFailed: `{failed}`"
+    )
+
+@bot.on_message(
+    filters.private & filters.text
+    & ~filters.command(
+        ["start", "help", "about", "broadcast", "thumb", "delthumb"]
+    )
+)
+async def handle_message(client, message):
+    if message.chat.id not in known_users:
+        known_users.add(message.chat.id)
+        # Registration shouldn't delay the reply
+        asyncio.create_task(register_user(message.chat.id))
+    text = message.text.strip()
+
+    match = COMBINED_URL_PATTERN.match(text)
+    if not match:
+        # Tracked: repeated bad links shouldn't pile error replies up
+        await send_tracked_message(
+            client, message.chat.id,
+            "❌ **Please send a valid direct download link or YouTube URL**"
+        )
+        return
+
+    # Hand over only the matched URL — trailing words like
+    # "https://... check this out" must not reach the downloaders
+    url = match.group(0)
+    if match.lastgroup == 'yt':
+        await process_youtube(client, message, url)
+    else:
+        await handle_url_message(client, message, url)
+
+@bot.on_message(filters.command("thumb") & filters.private)
+async def thumb_command(client, message):
+    reply = message.reply_to_message
+    if not reply or not reply.photo:
+        await message.reply_text(
+            "❌ **Reply to a photo with /thumb to set it as your thumbnail**"
+        )
+        return
+    # in_memory keeps the source photo off disk; only the resized JPEG
+    # is written
+    photo = await reply.download(in_memory=True)
+    await asyncio.to_thread(save_thumb, message.from_user.id, photo)
+    await message.reply_text("✅ **Thumbnail saved**")
+
+@bot.on_message(filters.command("delthumb") & filters.private)
+async def delthumb_command(client, message):
+    delete_thumb(message.from_user.id)
+    await message.reply_text("✅ **Thumbnail removed**")
+
+@bot.on_message(filters.command("start") & filters.private)
+async def start_command(client, message):
+    if message.chat.id not in known_users:
+        known_users.add(message.chat.id)
+        asyncio.create_task(register_user(message.chat.id))
+
+    user_info = await get_user_info(message.from_user.id)
+    await send_tracked_message(
+        client, message.chat.id,
+        render_start_text(**user_info),
+        reply_markup=START_KEYBOARD,
+        disable_web_page_preview=True
+    )
+
+@bot.on_message(filters.command("help") & filters.private)
+async def help_command(client, message):
+    await send_tracked_message(
+        client, message.chat.id, HELP_TEXT,
+        reply_markup=BACK_TO_START_KEYBOARD,
+        disable_web_page_preview=True
+    )
+
+@bot.on_message(filters.command("about") & filters.private)
+async def about_command(client, message):
+    await send_tracked_message(
+        client, message.chat.id, ABOUT_TEXT,
+        reply_markup=BACK_TO_START_KEYBOARD,
+        disable_web_page_preview=True
+    )
+
+@bot.on_callback_query(filters.regex("^(start|help|about)$"))
+async def menu_callback_handler(client, callback_query):
+    data = callback_query.data
+    if data == "start":
+        user_info = await get_user_info(callback_query.from_user.id)
+        text = render_start_text(**user_info)
+        keyboard = START_KEYBOARD
+    else:
+        text = HELP_TEXT if data == "help" else ABOUT_TEXT
+        keyboard = BACK_TO_START_KEYBOARD
+
+    await safe_edit_message(
+        callback_query.message, text,
+        reply_markup=keyboard, disable_web_page_preview=True
+    )
+    await callback_query.answer()
+
+async def start():
+    await bot.start()
+    # Warm the pooled session now so the first request doesn't pay
+    # connector setup
+    await get_session()
+    logger.info("Bot started")
+    # idle() parks the loop on a signal-aware event — no wake-up polling
+    # and a clean stop on SIGTERM
+    await idle()
+    await bot.stop()
+    await close_session()
+
+if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        # uvloop has no Windows build; the stock loop works everywhere
+        pass
+    asyncio.run(start())